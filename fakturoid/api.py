@@ -1,17 +1,27 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import copy
+import functools
+import operator
 import re
+import threading
 from dataclasses import dataclass, field
 import typing
 from typing import Optional, Final, Type, List, Mapping, Dict, Any
 from datetime import datetime, timedelta
-from pydantic import TypeAdapter
+from pydantic import BaseModel, ConfigDict, TypeAdapter, PrivateAttr
+from pydantic_core import from_json
 import base64
 import logging
+import time
 from string import Template
 from os import environ
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from fakturoid.models import (
     Model,
@@ -40,6 +50,32 @@ LOGGER: Final = logging.getLogger("python-fakturoid-v3")
 LINK_HEADER_PATTERN: Final = re.compile(r'page=(\d+)[^>]*>; rel="last"')
 
 
+def extract_page_link(header: str) -> Optional[int]:
+    """Returns the number of the last page advertised by the `Link` header."""
+    end = header.find('rel="last"')
+    if end < 0:
+        return None
+
+    # Fast path: read the page number out of the `<...>` preceding rel="last".
+    link_start = header.rfind("<", 0, end)
+    for marker in ("?page=", "&page="):
+        start = header.find(marker, link_start, end)
+        if start < 0:
+            continue
+        start += len(marker)
+        stop = start
+        while stop < end and header[stop].isdigit():
+            stop += 1
+        if stop > start:
+            return int(header[start:stop])
+
+    # Unusual formatting, let the regex sort it out.
+    match = LINK_HEADER_PATTERN.search(header)
+    if match is None:
+        return None
+    return int(match.group(1))
+
+
 class APIResponse:
     _requests_response: requests.Response
 
@@ -50,6 +86,15 @@ class APIResponse:
     def text(self):
         return self._requests_response.text
 
+    @property
+    def headers(self) -> Mapping[str, str]:
+        return self._requests_response.headers
+
+    @property
+    def content(self) -> bytes:
+        """Raw response body. Preferred for validation as it skips decoding to str."""
+        return self._requests_response.content
+
     def json(self):
         return self._requests_response.json()
 
@@ -65,16 +110,30 @@ class JWTToken(Model):
     @property
     def renew_after(self):
         """Token is to be renewed sooner than it expires to provide a buffer time for the renewal."""
-        return self.created_at + self.expires_in / 2
+        return self._renew_after
+
+    # Derived from the fields above, which do not change once the token is issued.
+    _renew_after: datetime = PrivateAttr()
+    _expiration_time: datetime = PrivateAttr()
+    _renew_after_monotonic: float = PrivateAttr(default=0.0)
+    _auth_header: str = PrivateAttr(default="")
+
+    def model_post_init(self, context: Any) -> None:
+        self._renew_after = self.created_at + self.expires_in / 2
+        self._expiration_time = self.created_at + self.expires_in
+        self._auth_header = f"{self.token_type} {self.access_token}"
+        # Translate the renewal deadline to the monotonic clock once, so the check
+        # done before every request is a single float comparison.
+        remaining = (self.renew_after - datetime.now()).total_seconds()
+        self._renew_after_monotonic = time.monotonic() + remaining
 
     @property
     def to_be_renewed(self):
-        now = datetime.now()
-        return self.renew_after <= now
+        return self._renew_after_monotonic <= time.monotonic()
 
     @property
     def expiration_time(self):
-        return self.created_at + self.expires_in
+        return self._expiration_time
 
     @property
     def is_expired(self):
@@ -94,12 +153,34 @@ class NotFoundError(FakturoidError):
     pass
 
 
+@functools.cache
+def _format_string(template: Template) -> str:
+    """Converts `template` to a str.format_map string substituting the same way."""
+    text = template.template
+    parts = []
+    end = 0
+    for match in template.pattern.finditer(text):
+        parts.append(text[end : match.start()].replace("{", "{{").replace("}", "}}"))
+        name = match.group("named") or match.group("braced")
+        if name is not None:
+            parts.append(f"{{{name}}}")
+        elif match.group("escaped") is not None:
+            parts.append(template.delimiter)
+        else:
+            raise ValueError(f"Invalid placeholder in template {text!r}")
+        end = match.end()
+    parts.append(text[end:].replace("{", "{{").replace("}", "}}"))
+    return "".join(parts)
+
+
 class APIBase(ABC):
     _fakturoid: Optional["Fakturoid"]
     base_path_template: Template
 
     def __init__(self, base_path_context: Optional[dict[str, str]] = None):
         self.base_path_context = base_path_context or {}
+        # (slug, path) of the last argument-less base_path() call.
+        self._base_path_cache: Optional[tuple[str, str]] = None
 
     @property
     def fakturoid(self) -> "Fakturoid":
@@ -107,40 +188,65 @@ class APIBase(ABC):
         return self._fakturoid
 
     def base_path(self, **kwargs: str) -> str:
-        return self.base_path_template.substitute(
-            slug=self.fakturoid.slug, **self.base_path_context, **kwargs
-        )
+        slug = self.fakturoid.slug
+        if kwargs:
+            return _format_string(self.base_path_template).format_map(
+                {"slug": slug, **self.base_path_context, **kwargs}
+            )
 
-    def __get__(self, obj: Fakturoid, objtype: Optional[Type[Fakturoid]] = None):
-        self._fakturoid = obj
-        return self
+        # The path without kwargs only depends on the slug, so it is computed once.
+        if self._base_path_cache is None or self._base_path_cache[0] != slug:
+            path = _format_string(self.base_path_template).format_map(
+                {"slug": slug, **self.base_path_context}
+            )
+            self._base_path_cache = (slug, path)
+        return self._base_path_cache[1]
+
+    def __set_name__(self, owner: Type[Fakturoid], name: str):
+        self._attr_name = name
+
+    def __get__(
+        self, obj: Optional[Fakturoid], objtype: Optional[Type[Fakturoid]] = None
+    ):
+        if obj is None:
+            return self
+        # Bind a copy to the client and store it in the instance dict, where
+        # it shadows this (non-data) descriptor on all subsequent accesses.
+        bound = copy.copy(self)
+        bound._fakturoid = obj
+        obj.__dict__[self._attr_name] = bound
+        return bound
 
 
 class LoadableAPI[M: Model](APIBase):
     _model_type: Type[M]
+    _item_type_adapter: TypeAdapter[M]
 
     @property
     def _model_type_(self) -> Type[M]:
         raise NotImplementedError("Subclasses must implement this method.")
 
     def load(self) -> M:
-        self.fakturoid.ensure_authenticated()
         response = self.fakturoid.get(f"{self.base_path()}.json")
-        return self._model_type.model_validate_json(response.text)
+        return self._item_type_adapter.validate_json(response.content)
 
 
 class AbstractCollectionAPI[T_UniqueMixin: UniqueMixin](APIBase):
     PER_PAGE: Final[int] = 40
+    # Fetch the remaining pages concurrently when the `Link` header tells the page count.
+    PARALLEL_PAGES: bool = True
+    MAX_PAGE_WORKERS: int = 8
+    # Query parameters the index endpoint filters by, see find().
+    server_filters: frozenset[str] = frozenset()
     _model_type: Type[T_UniqueMixin]
+    _item_type_adapter: TypeAdapter[T_UniqueMixin]
     _page_type_adapter: TypeAdapter[List[T_UniqueMixin]]
 
     def get(self, id: int) -> T_UniqueMixin:
-        self.fakturoid.ensure_authenticated()
         response = self.fakturoid.get(f"{self.base_path()}/{id}.json")
-        return self._bind(self._model_type.model_validate_json(response.text))
+        return self._bind(self._item_type_adapter.validate_json(response.content))
 
     def _bind(self, obj: T_UniqueMixin) -> T_UniqueMixin:
-        assert isinstance(obj, Model)
         obj.__resource_path__ = self.base_path()
         return obj
 
@@ -154,67 +260,165 @@ class AbstractCollectionAPI[T_UniqueMixin: UniqueMixin](APIBase):
         """
         Returns iterator over all items in collection.
         """
-        return self._paginated(f"{self.base_path()}.json", **params)
+        return self._paginated(
+            f"{self.base_path()}.json", params, self.fakturoid.trust_server
+        )
 
     def find(self, **kwargs: Any) -> typing.Iterator[T_UniqueMixin]:
-        all_items = self.index(**kwargs)
-        for item in all_items:
-            if all(getattr(item, k) == v for k, v in kwargs.items()):
+        """
+        Returns iterator over items matching all the given field values.
+
+        Filters listed in `server_filters` are sent as query parameters and
+        evaluated by Fakturoid, the rest is compared on the returned items.
+        Those are always validated, even with `Fakturoid.trust_server`, so
+        that e.g. decimals and dates compare equal to the given values.
+        """
+        params = {k: v for k, v in kwargs.items() if k in self.server_filters}
+        local = {k: v for k, v in kwargs.items() if k not in self.server_filters}
+        if not local:
+            yield from self.index(**params)
+            return
+
+        # attrgetter returns a bare value for one name and a tuple for more.
+        getter = operator.attrgetter(*local)
+        values = tuple(local.values())
+        expected = values if len(values) > 1 else values[0]
+        for item in self._paginated(f"{self.base_path()}.json", params, False):
+            if getter(item) == expected:
                 yield item
 
+    def find_one(self, **kwargs: Any) -> Optional[T_UniqueMixin]:
+        """
+        Returns the first item matching the given field values or None.
+
+        Stops paginating as soon as a match is found.
+        """
+        return next(self.find(**kwargs), None)
+
     def search(self, **params: str) -> typing.Iterator[T_UniqueMixin]:
         """
         Does fulltext search
         """
-        return self._paginated(f"{self.base_path()}/search.json", **params)
+        return self._paginated(
+            f"{self.base_path()}/search.json", params, self.fakturoid.trust_server
+        )
 
-    def _paginated(self, path: str, **params: str) -> typing.Iterator[T_UniqueMixin]:
-        self.fakturoid.ensure_authenticated()
-        page_no = 1
+    def _paginated(
+        self, path: str, params: Mapping[str, str], trusted: bool
+    ) -> typing.Iterator[T_UniqueMixin]:
+        response = self._get_page(path, 1, params)
 
-        while True:
-            # Include the `page` parameter in the request
-            paged_params: Dict[str, str] = {**params, "page": str(page_no)}
-            response = self.fakturoid.get(
-                f"{self.base_path()}.json", params=paged_params
+        last_page = extract_page_link(response.headers.get("Link", ""))
+        if self.PARALLEL_PAGES and last_page is not None and last_page > 1:
+            # The server told us how many pages there are, fetch them all at once.
+            yield from self._paginated_parallel(
+                path, response, last_page, params, trusted
             )
-            results_page = self._page_type_adapter.validate_json(response.text)
-            # Yield each item from the current page
-            for item in results_page:
-                yield self._bind(item)
+            return
+
+        page_no = 1
+        prefetcher: Optional[ThreadPoolExecutor] = None
+        try:
+            while True:
+                results_page = self._parse_page(response, trusted)
+
+                next_response: Optional[Future[APIResponse]] = None
+                if last_page is not None and page_no >= last_page:
+                    pass  # The server told us this is the last page
+                elif self.PER_PAGE > len(results_page):
+                    pass  # Stop if no results are returned
+                else:
+                    # Download the next page while the caller consumes this one.
+                    prefetcher = prefetcher or ThreadPoolExecutor(max_workers=1)
+                    next_response = prefetcher.submit(
+                        self._get_page, path, page_no + 1, params
+                    )
+
+                # Yield each item from the current page
+                yield from results_page
+
+                if next_response is None:
+                    break
+                page_no += 1  # Increment page number to fetch the next page
+                response = next_response.result()
+        finally:
+            if prefetcher is not None:
+                prefetcher.shutdown(cancel_futures=True)
+
+    def _paginated_parallel(
+        self,
+        path: str,
+        first_response: APIResponse,
+        last_page: int,
+        params: Mapping[str, str],
+        trusted: bool,
+    ) -> typing.Iterator[T_UniqueMixin]:
+        # More workers than pooled connections would just wait for one.
+        max_workers = min(
+            self.MAX_PAGE_WORKERS, self.fakturoid.pool_maxsize, last_page - 1
+        )
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        page_numbers = iter(range(2, last_page + 1))
+        # Pages requested but not yielded yet, in page order. Only max_workers of
+        # them are kept ahead of the caller, so a slow consumer or an early
+        # stop does not download and buffer the whole collection.
+        pending: deque[Future[APIResponse]] = deque()
+
+        def request_next_page() -> None:
+            page_no = next(page_numbers, None)
+            if page_no is not None:
+                pending.append(executor.submit(self._get_page, path, page_no, params))
+
+        try:
+            for _ in range(max_workers):
+                request_next_page()
+            yield from self._parse_page(first_response, trusted)
+            while pending:
+                response = pending.popleft().result()
+                request_next_page()
+                yield from self._parse_page(response, trusted)
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def _parse_page(self, response: APIResponse, trusted: bool) -> List[T_UniqueMixin]:
+        """Returns the items of a page, bound to this collection."""
+        if trusted:
+            # Skips validation, see `Fakturoid.trust_server`.
+            items = [
+                self._model_type.from_trusted(data)
+                for data in from_json(response.content)
+            ]
+        else:
+            items = self._page_type_adapter.validate_json(response.content)
 
-            if self.PER_PAGE > len(results_page):
-                break  # Stop if no results are returned
+        base_path = self.base_path()
+        for item in items:
+            item.__resource_path__ = base_path
+        return items
 
-            page_no += 1  # Increment page number to fetch the next page
+    def _get_page(
+        self, path: str, page_no: int, params: Mapping[str, str]
+    ) -> APIResponse:
+        # Include the `page` parameter in the request
+        paged_params: Dict[str, str] = {**params, "page": str(page_no)}
+        return self.fakturoid.get(path, params=paged_params)
 
     def create(self, instance: T_UniqueMixin) -> T_UniqueMixin:
-        self.fakturoid.ensure_authenticated()
-        json_str = instance.model_dump_json(exclude_unset=True)
-        response = self.fakturoid.post(f"{self.base_path()}.json", json_str)
-        return self._model_type.model_validate_json(response.text)
+        payload = self._item_type_adapter.dump_json(instance, exclude_unset=True)
+        response = self.fakturoid.post(f"{self.base_path()}.json", payload)
+        return self._item_type_adapter.validate_json(response.content)
 
     def delete(self, instance_id: int) -> None:
-        self.fakturoid.ensure_authenticated()
-        response = self.fakturoid.session.delete(
-            f"{self.fakturoid.base_url}/{self.base_path()}/{instance_id}.json"
-        )
         try:
-            response.raise_for_status()
-        except requests.HTTPError as err:
-            fakturoid_error = FakturoidError(
-                f"Couldn't delete {instance_id}. {response.text}"
-            )
-            raise fakturoid_error from err
+            self.fakturoid.delete(f"{self.base_path()}/{instance_id}.json")
+        except FakturoidError as err:
+            raise FakturoidError(f"Couldn't delete {instance_id}. {err}") from err
 
     def update(self, instance: T_UniqueMixin) -> T_UniqueMixin:
-        payload = instance.to_patch_payload()
-        self.fakturoid.ensure_authenticated()
         response = self.fakturoid.patch(
-            f"{self.base_path()}/{instance.id}.json",
-            payload.model_dump_json(exclude_unset=True),
+            f"{self.base_path()}/{instance.id}.json", instance.to_patch_json()
         )
-        return self._model_type.model_validate_json(response.text)
+        return self._item_type_adapter.validate_json(response.content)
 
     def save(self, instance: T_UniqueMixin) -> T_UniqueMixin:
         if instance.id:
@@ -226,10 +430,22 @@ class AbstractCollectionAPI[T_UniqueMixin: UniqueMixin](APIBase):
 class ActionAPI[A: StrEnum](APIBase):
     base_path_template: Template
     slug: str
+    # (slug, prefix, suffix) of the path split around the document id.
+    _path_parts: Optional[tuple[str, str, str]] = None
 
     def fire(self, id: int, action: A):
-        path = self.base_path(id=str(id))
-        self.fakturoid.post(path, data=None, params={"event": action.value})
+        self.fakturoid.post_ignoring_response(
+            self._path(id), params={"event": action.value}
+        )
+
+    def _path(self, id: int) -> str:
+        slug = self.fakturoid.slug
+        if self._path_parts is None or self._path_parts[0] != slug:
+            # Substitute the template once and split it around the id, so that
+            # firing an action only concatenates strings.
+            prefix, _, suffix = self.base_path(id="\0").partition("\0")
+            self._path_parts = (slug, prefix, suffix)
+        return f"{self._path_parts[1]}{id}{self._path_parts[2]}"
 
 
 class PaymentsAPI[T_UniqueMixin: UniqueMixin, T_Payment: Payment](APIBase):
@@ -238,13 +454,12 @@ class PaymentsAPI[T_UniqueMixin: UniqueMixin, T_Payment: Payment](APIBase):
     def create(self, payable: T_UniqueMixin, payment: T_Payment) -> T_Payment:
         assert payable.id
         response = self._create(payable_id=payable.id, payment=payment)
-        return self.model.model_validate_json(response.text)
+        return self.model.model_validate_json(response.content)
 
     def _create(self, payable_id: int, payment: T_Payment):
         path = self.base_path(payable_id=str(payable_id)) + ".json"
-        self.fakturoid.ensure_authenticated()
-        response = self.fakturoid.post(path, data=payment.model_dump_json())
-        return response
+        payload = payment.__pydantic_serializer__.to_json(payment)
+        return self.fakturoid.post(path, data=payload)
 
     def delete(self, payable: T_UniqueMixin, payment: T_Payment):
         assert payable.id
@@ -261,11 +476,12 @@ class InvoicePaymentsAPI(PaymentsAPI[Invoice, InvoicePayment]):
         assert invoice.id
         assert payment.id
         path = (
-            self.base_path(payble_id=str(invoice.id))
+            self.base_path(payable_id=str(invoice.id))
             + f"/{payment.id}/create_tax_document.json"
         )
-        response = self.fakturoid.post(path, data=payment.model_dump_json())
-        return InvoicePayment.model_validate_json(response.text)
+        payload = payment.__pydantic_serializer__.to_json(payment)
+        response = self.fakturoid.post(path, data=payload)
+        return InvoicePayment.model_validate_json(response.content)
 
 
 class ExpensePaymentsAPI(PaymentsAPI[Expense, ExpensePayment]):
@@ -273,15 +489,37 @@ class ExpensePaymentsAPI(PaymentsAPI[Expense, ExpensePayment]):
     base_path_template = Template(r"accounts/${slug}/expenses/${payable_id}/payments")
 
 
+@functools.cache
+def _type_adapter(type_: Any) -> TypeAdapter[Any]:
+    """Returns a TypeAdapter shared by everything in the process validating `type_`."""
+    if isinstance(type_, type) and issubclass(type_, BaseModel):
+        return TypeAdapter(type_)  # Follows the model's own defer_build.
+    # Build the schema on first use, like the models themselves.
+    return TypeAdapter(type_, config=ConfigDict(defer_build=True))
+
+
+@functools.cache
+def _build_type_adapters() -> None:
+    """Builds the schemas of the API adapters, deferred at import, once per process."""
+    for api in vars(Fakturoid).values():
+        for name in ("_item_type_adapter", "_page_type_adapter"):
+            adapter: Optional[TypeAdapter[Any]] = getattr(api, name, None)
+            if adapter is not None:
+                adapter.rebuild()
+
+
 def create_collection_api_class[T_UniqueMixin: UniqueMixin](
     model_t: Type[T_UniqueMixin],
     base_path_template_: Template,
+    server_filters_: typing.Iterable[str] = (),
 ) -> type[AbstractCollectionAPI[T_UniqueMixin]]:
 
     class _AutoAPI(AbstractCollectionAPI[T_UniqueMixin]):
         _model_type = model_t
         base_path_template = base_path_template_
-        _page_type_adapter = TypeAdapter(List[model_t])  # type: ignore[valid-type]
+        server_filters = frozenset(server_filters_)
+        _item_type_adapter = _type_adapter(model_t)
+        _page_type_adapter = _type_adapter(List[model_t])  # type: ignore[valid-type]
 
     _AutoAPI.__name__ = f"{model_t.__name__}sCollectionAPI"
 
@@ -300,8 +538,35 @@ class Fakturoid:
     user_agent: str = (
         "python-fakturoid-v3 (https://github.com/jarovo/python-fakturoid-v3)"
     )
+    # Build listed items with Model.from_trusted instead of validating them. Much
+    # faster on large listings, but values are taken from the JSON as they are,
+    # e.g. dates stay strings. Nested models (e.g. invoice lines) are built too.
+    # Trusted items are meant for reading, validate them before saving them back.
+    # find() validates the pages it filters locally regardless of this.
+    trust_server: bool = False
+    # Keep-alive connections pooled for the API host. Raise it together with
+    # MAX_PAGE_WORKERS when fetching many pages concurrently.
+    pool_maxsize: int = 32
+    # Number of GET responses kept, with their bodies, to revalidate by ETag.
+    # Caching is off by default.
+    etag_cache_size: int = 0
+    _basic_auth: str = field(init=False, repr=False)
     _token: JWTToken = field(init=False)
+    # Token whose Authorization header is currently set on the session.
+    _authorized_token: Optional[JWTToken] = field(init=False, default=None)
     session: requests.Session = field(init=False)
+    # ETag and response of recent GETs, keyed by URL and query parameters.
+    _etag_cache: dict[
+        tuple[str, tuple[tuple[str, str], ...]], tuple[str, requests.Response]
+    ] = field(init=False, default_factory=dict)
+    # GETs run on the page prefetching and parallel fetching threads too.
+    _etag_lock: threading.Lock = field(
+        init=False, repr=False, compare=False, default_factory=threading.Lock
+    )
+    # Held while renewing the token, so that concurrent page fetches renew it once.
+    _auth_lock: threading.Lock = field(
+        init=False, repr=False, compare=False, default_factory=threading.Lock
+    )
 
     @classmethod
     def from_env(cls):
@@ -312,21 +577,25 @@ class Fakturoid:
         )
 
     subjects = create_collection_api_class(
-        Subject, Template("accounts/${slug}/subjects")
+        Subject, Template("accounts/${slug}/subjects"), {"custom_id"}
     )()
     invoices = create_collection_api_class(
-        Invoice, Template("accounts/${slug}/invoices")
+        Invoice,
+        Template("accounts/${slug}/invoices"),
+        {"number", "status", "subject_id", "custom_id", "document_type"},
     )()
 
     class UserAPI(LoadableAPI[User]):
         base_path_template = Template("user")
         _model_type = User
+        _item_type_adapter = _type_adapter(User)
 
     current_user = UserAPI()
 
     class AccountApi(LoadableAPI[Account]):
         base_path_template = Template("accounts/${slug}/account")
         _model_type = Account
+        _item_type_adapter = _type_adapter(Account)
 
     account = AccountApi()
 
@@ -343,31 +612,56 @@ class Fakturoid:
     invoice_payment = InvoicePaymentsAPI()
 
     inventory_items = create_collection_api_class(
-        InventoryItem, Template("accounts/${slug}/inventory_items")
+        InventoryItem, Template("accounts/${slug}/inventory_items"), {"sku"}
     )()
     expenses = create_collection_api_class(
-        Expense, Template("accounts/${slug}/expenses")
+        Expense,
+        Template("accounts/${slug}/expenses"),
+        {"number", "variable_symbol", "subject_id", "custom_id"},
     )()
 
     class ExpenseActionAPI(ActionAPI[LockableAction]):
-        base_path_template = Template("accounts/${slug}/invoices/${id}/fire.json")
+        base_path_template = Template("accounts/${slug}/expenses/${id}/fire.json")
 
     expense_action = ExpenseActionAPI()
     expense_payment = ExpensePaymentsAPI()
 
     generators = create_collection_api_class(
-        Generator, Template("accounts/${slug}/generators")
+        Generator, Template("accounts/${slug}/generators"), {"subject_id"}
     )()
 
     base_url = "https://app.fakturoid.cz/api/v3"
 
     def __post_init__(self):
+        # Pay for the schemas when the first client is created rather than on
+        # its first request, while importing the package stays cheap.
+        _build_type_adapters()
+
+        # Client credentials never change, encode them once. RFC 7617 mandates
+        # the standard base64 alphabet, not the URL-safe one.
+        credentials = f"{self.client_id}:{self.client_secret}".encode("utf-8")
+        self._basic_auth = "Basic " + base64.b64encode(credentials).decode()
+
         # Init to dummy expired token that is about to lazy renewal.
         self._token = JWTToken(
             token_type="placeholder_token", access_token="", expires_in=timedelta(-1)
         )
 
         self.session = requests.Session()
+        # Keep enough pooled connections for concurrent page fetches and retry
+        # transient failures. POST is not retried as it is not idempotent.
+        retry = Retry(
+            total=3,
+            backoff_factor=0.2,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset(["GET", "PATCH", "DELETE"]),
+            raise_on_status=False,
+        )
+        # All traffic goes to the single API host, so one host pool is enough.
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.pool_maxsize, max_retries=retry
+        )
+        self.session.mount("https://", adapter)
         self.session.headers.update(
             {
                 "User-Agent": self.user_agent,
@@ -380,52 +674,85 @@ class Fakturoid:
         if self._token.to_be_renewed:
             LOGGER.debug("Renewing _token.")
             self._oauth_token_client_credentials_flow()
-            LOGGER.debug(f"Got new _token. {self._token}")
+            LOGGER.debug("Got new _token. %s", self._token)
         return self._token
 
     def _oauth_token_client_credentials_flow(self):
-        credentials = base64.urlsafe_b64encode(
-            b":".join(
-                (self.client_id.encode("utf-8"), self.client_secret.encode("utf-8"))
-            )
-        )
         headers = {
             "Accept": "application/json",
+            "Content-Type": "application/x-www-form-urlencoded",
             "User-Agent": self.user_agent,
-            "Authorization": "Basic " + credentials.decode(),
+            "Authorization": self._basic_auth,
         }
-        resp = requests.post(
+        # Go through the session so the token renewal reuses the pooled
+        # keep-alive connection to the API host.
+        resp = self.session.post(
             f"{self.base_url}/oauth/token",
             headers=headers,
             data={"grant_type": "client_credentials"},
         )
         resp.raise_for_status()
-        self._token = JWTToken.model_validate_json(resp.text)
+        self._token = JWTToken.model_validate_json(resp.content)
 
     def ensure_authenticated(self):
-        self._ensure_token()
-        self._set_authorization(self.user_agent, self._token)
+        token = self._token
+        if self._authorized_token is token and not token.to_be_renewed:
+            return
+        with self._auth_lock:
+            # Another thread may have renewed the token while we waited.
+            self._ensure_token()
+            if self._authorized_token is not self._token:
+                self._set_authorization(self.user_agent, self._token)
+                self._authorized_token = self._token
 
     def _set_authorization(self, user_agent: str, jwt_token: JWTToken):
         self.session.headers.update(
             {
                 "User-Agent": user_agent,
-                "Authorization": jwt_token.token_type + " " + jwt_token.access_token,
+                "Authorization": jwt_token._auth_header,
             }
         )
 
     def get(self, path: str, params: Optional[Mapping[str, str]] = None) -> APIResponse:
+        self.ensure_authenticated()
         url = f"{self.base_url}/{path}"
-        response = self.session.get(url, params=params)
+        cache_key = (url, tuple(sorted(params.items())) if params else ())
+        cached = None
+        if self.etag_cache_size:
+            with self._etag_lock:
+                cached = self._etag_cache.get(cache_key)
+        if cached is None:
+            response = self.session.get(url, params=params)
+        else:
+            response = self.session.get(
+                url, params=params, headers={"If-None-Match": cached[0]}
+            )
+            if response.status_code == 304:
+                # Unchanged since the last time, replay the body we already have.
+                return APIResponse(cached[1])
+
         if response.status_code == 404:
             raise NotFoundError(f"url={url}, reason={response.text}")
         else:
             response.raise_for_status()
+
+        etag = response.headers.get("ETag") if self.etag_cache_size else None
+        if etag:
+            with self._etag_lock:
+                self._etag_cache.pop(cache_key, None)
+                while len(self._etag_cache) >= self.etag_cache_size:
+                    # Evict the least recently stored entry.
+                    del self._etag_cache[next(iter(self._etag_cache))]
+                self._etag_cache[cache_key] = (etag, response)
         return APIResponse(response)
 
     def post(
-        self, path: str, data: str | None, params: Optional[dict[str, str]] = None
+        self,
+        path: str,
+        data: bytes | str | None,
+        params: Optional[dict[str, str]] = None,
     ) -> APIResponse:
+        self.ensure_authenticated()
         url = f"{self.base_url}/{path}"
         response = self.session.post(url, data=data, params=params)
         try:
@@ -435,18 +762,32 @@ class Fakturoid:
             raise new_err from err
         return APIResponse(response)
 
-    def patch(self, path: str, json_str: str) -> APIResponse:
+    def patch(self, path: str, json_str: bytes | str) -> APIResponse:
         self.ensure_authenticated()
         response = self.session.patch(f"{self.base_url}/{path}", data=json_str)
         response.raise_for_status()
         return APIResponse(response)
 
-    def delete(self, path: str):
+    def post_ignoring_response(
+        self, path: str, params: Optional[dict[str, str]] = None
+    ) -> None:
+        """Posts a request without payload whose response body is of no use."""
+        self.ensure_authenticated()
+        url = f"{self.base_url}/{path}"
+        self._check_and_close(self.session.post(url, params=params, stream=True))
+
+    def delete(self, path: str) -> None:
         self.ensure_authenticated()
-        response = self.session.delete(f"{self.base_url}/{path}")
+        url = f"{self.base_url}/{path}"
+        self._check_and_close(self.session.delete(url, stream=True))
+
+    def _check_and_close(self, response: requests.Response) -> None:
+        # The body of a streamed response is only downloaded for the error
+        # message, closing it returns the connection to the pool right away.
         try:
             response.raise_for_status()
         except requests.HTTPError as err:
             new_err = FakturoidError(response.text)
             raise new_err from err
-        return APIResponse(response)
+        finally:
+            response.close()
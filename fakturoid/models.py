@@ -1,9 +1,13 @@
+import collections.abc
+import dataclasses
+import functools
 import logging
 from datetime import date, datetime
-from typing import Optional, Union, Literal, Any, Sequence
+from typing import Optional, Union, Literal, Any, Sequence, ClassVar, Self
+from typing import get_args, get_origin
 from decimal import Decimal
-from pydantic.dataclasses import dataclass
-from pydantic import Field, BaseModel, EmailStr, AnyUrl
+from pydantic.dataclasses import dataclass, is_pydantic_dataclass
+from pydantic import ConfigDict, Field, BaseModel, EmailStr
 
 from fakturoid.strenum import StrEnum
 
@@ -16,44 +20,129 @@ LOGGER = logging.getLogger("python-fakturoid-v3-model")
 class Model(BaseModel):
     """Base class for all Fakturoid model objects"""
 
-    __original_data__: dict[str, Any] = {}
+    model_config = ConfigDict(defer_build=True)
+
     __resource_path__: Optional[str] = None
+    # Fields always sent on update, collected from Meta.always_include.
+    __always_include__: ClassVar[frozenset[str]] = frozenset()
 
-    def __init__(self, **data: Any):
-        super().__init__(**data)
-        object.__setattr__(self, "__original_data__", self.model_dump())
+    def __init_subclass__(cls, **kwargs: Any):
+        super().__init_subclass__(**kwargs)
+        meta = getattr(cls, "Meta", None)
+        cls.__always_include__ = frozenset(getattr(meta, "always_include", ()))
+        fields = ", ".join(f"{k}={{{k}}}" for k in cls._display_fields)
+        cls._display_template = f"<{cls.__name__} {fields}>"
 
     def changed_fields(self) -> dict[str, Any]:
-        # Start with changed values (unset or default-excluded)
-        base = self.model_dump(exclude_defaults=True, exclude_unset=True)
-
-        # Get fields to always include (e.g. foreign keys)
-        meta = getattr(self, "Meta", None)
-        always = getattr(meta, "always_include", []) if meta else []
-
-        for field in always:
-            if field not in base and hasattr(self, field):
+        # Start with the fields set on construction or assignment, which pydantic
+        # tracks in model_fields_set, leaving out those still at their default.
+        # Nested models are trimmed the same way.
+        fields = type(self).model_fields
+        base = {
+            name: _patch_value(value)
+            for name in self.model_fields_set
+            if (value := getattr(self, name))
+            != fields[name].get_default(call_default_factory=True)
+        }
+
+        # Add fields to always include (e.g. foreign keys)
+        for field in self.__always_include__:
+            if field not in base:
                 base[field] = getattr(self, field)
 
         return base
 
     def to_patch_payload(self):
-        return type(self)(**self.changed_fields())
-
-    _display_fields = list[str]()
+        # The values have been validated already, no need to do it again.
+        return type(self).model_construct(**self.changed_fields())
+
+    def to_patch_json(self) -> bytes:
+        """Serializes the changed_fields() straight to JSON, without building a payload model."""
+        # Leaving out the unset and default fields at every level is what
+        # changed_fields() does, without trimming the nested models separately.
+        return self.__pydantic_serializer__.to_json(
+            self,
+            include=self.model_fields_set | self.__always_include__,
+            exclude_unset=True,
+            exclude_defaults=True,
+        )
+
+    @classmethod
+    def from_trusted(cls, data: dict[str, Any]) -> Self:
+        """
+        Builds the model from data that came from the server without validating it.
+
+        Nested models and dataclasses are built the same way. Other values are
+        kept as they are in the JSON, e.g. dates stay strings.
+        """
+        nested = _nested_models(cls)
+        if nested:
+            data = dict(data)
+            for name, (type_, many) in nested.items():
+                value = data.get(name)
+                if value is None:
+                    continue
+                if many:
+                    data[name] = [_from_trusted(type_, item) for item in value]
+                else:
+                    data[name] = _from_trusted(type_, value)
+        return cls.model_construct(**data)
+
+    _display_fields: ClassVar[tuple[str, ...]] = ()
+    # str.format template rendering the _display_fields, set for each subclass.
+    _display_template: ClassVar[str] = "<Model >"
 
     def __str__(self):
-        values = {k: getattr(self, k) for k in self._display_fields}
-        return f"<{self.__class__.__name__} {', '.join(f'{k}={v}' for k, v in values.items())}>"
+        return self._display_template.format_map(self.__dict__)
+
+
+def _patch_value(value: Any) -> Any:
+    """Trims models nested in a changed field down to their own changed fields."""
+    if isinstance(value, Model):
+        return value.to_patch_payload()
+    if isinstance(value, list):
+        return [_patch_value(item) for item in value]
+    return value
+
+
+def _from_trusted(type_: Any, data: dict[str, Any]) -> Any:
+    """Builds a model or a pydantic dataclass from server data without validating it."""
+    if issubclass(type_, Model):
+        return type_.from_trusted(data)
+    # Bypass the validating __init__ of the dataclass and set its fields directly.
+    obj = object.__new__(type_)
+    for field in dataclasses.fields(type_):
+        default = None if field.default is dataclasses.MISSING else field.default
+        object.__setattr__(obj, field.name, data.get(field.name, default))
+    return obj
+
+
+@functools.cache
+def _nested_models(cls: type[Model]) -> dict[str, tuple[type, bool]]:
+    """Maps fields holding nested models or pydantic dataclasses to (type, is_list)."""
+    nested = {}
+    for name, field in cls.model_fields.items():
+        annotation = field.annotation
+        if get_origin(annotation) is Union:
+            # Optional[X] -> X
+            annotation = next(a for a in get_args(annotation) if a is not type(None))
+        many = get_origin(annotation) in (list, collections.abc.Sequence)
+        if many:
+            (annotation,) = get_args(annotation)
+        if isinstance(annotation, type) and (
+            issubclass(annotation, Model) or is_pydantic_dataclass(annotation)
+        ):
+            nested[name] = (annotation, many)
+    return nested
 
 
 Currency = str
 
 
 class UniqueMixin(Model):
-    _display_fields = ["id"]
+    _display_fields: ClassVar[tuple[str, ...]] = ("id",)
 
-    id: Optional[int] = Field(default_factory=lambda: None, exclude=False)
+    id: Optional[int] = None
 
 
 class TimeTrackedMixin(Model):
@@ -119,9 +208,9 @@ class Account(TimeTrackedMixin):
     plan: Optional[str] = None
     plan_price: Optional[Decimal] = None
     plan_paid_users: Optional[int] = None
-    invoice_email: Optional[EmailStr] = None
+    invoice_email: Optional[str] = None
     phone: Optional[str] = None
-    web: Optional[AnyUrl] = None
+    web: Optional[str] = None
     name: Optional[str] = None
     full_name: Optional[str] = None
     registration_no: Optional[str] = None
@@ -142,7 +231,9 @@ class Account(TimeTrackedMixin):
     invoice_language: Optional[Language] = None
     invoice_payment_method: Optional[PaymentMethod] = None
     invoice_proforma: Optional[bool] = None
-    invoice_hide_bank_account_for_payments: Optional[set[HidingPaymentTypes]] = None
+    invoice_hide_bank_account_for_payments: Optional[frozenset[HidingPaymentTypes]] = (
+        None
+    )
     fixed_exchange_rate: Optional[bool] = None
     invoice_selfbilling: Optional[bool] = None
     default_estimate_type: Optional[DefaultEstimate] = None
@@ -158,22 +249,23 @@ class Account(TimeTrackedMixin):
     digitoo_extractions_remaining: Optional[int] = None
 
 
-class UserAccount(Model):
+@dataclass(slots=True)
+class UserAccount:
     slug: Optional[str] = None
-    logo: Optional[AnyUrl] = None
+    logo: Optional[str] = None
     name: Optional[str] = None
     registration_no: Optional[str] = None
     permission: Optional[str] = None
-    allowed_scope: Optional[set[AllowedScope]] = None
+    allowed_scope: Optional[frozenset[AllowedScope]] = None
 
 
 class User(UniqueMixin):
     full_name: Optional[str] = None
-    email: Optional[EmailStr] = None
-    avatar_url: Optional[AnyUrl] = None
+    email: Optional[str] = None
+    avatar_url: Optional[str] = None
     default_account: Optional[str] = None
     permission: Optional[str] = None
-    allowed_scope: Optional[set[AllowedScope]] = None
+    allowed_scope: Optional[frozenset[AllowedScope]] = None
     accounts: Optional[list[UserAccount]] = None
 
 
@@ -202,7 +294,6 @@ class Inherswitch(StrEnum):
 
 
 class WebinvoiceHistory(StrEnum):
-    Null = None
     Disabled = "disabled"
     Recent = "recent"
     ClientPortal = "client_portal"
@@ -210,7 +301,7 @@ class WebinvoiceHistory(StrEnum):
 
 class Subject(UniqueMixin, TimeTrackedMixin):
 
-    _display_fields = ["name"]
+    _display_fields = ("name",)
 
     name: str
 
@@ -256,22 +347,11 @@ class Subject(UniqueMixin, TimeTrackedMixin):
     thank_you_email_text: Optional[str] = None
     custom_estimate_email_text: Optional[str] = None
     webinvoice_history: Optional[WebinvoiceHistory] = None
-    html_url: Optional[AnyUrl] = None
-    url: Optional[AnyUrl] = None
+    html_url: Optional[str] = None
+    url: Optional[str] = None
 
-    class Meta:
-        readonly = [
-            "id",
-            "user_id",
-            "unreliable",
-            "unreliable_checked_at",
-            "html_url",
-            "url",
-            "created_at" "updated_at",
-        ]
-
-
-@dataclass
+
+@dataclass(slots=True)
 class LineInventory:
     item_id: int
     sku: str
@@ -294,12 +374,9 @@ class Line(UniqueMixin):
     sku: Optional[str] = None
     inventory: Optional[LineInventory] = None
 
-    class Meta:
-        readonly: list[str] = []  # no id here, to correct update
-        decimal = ["quantity", "unit_price"]
-
 
-class VatRateSummary(Model):
+@dataclass(slots=True)
+class VatRateSummary:
     vat_rate: Decimal
     base: Decimal
     vat: Decimal
@@ -325,7 +402,7 @@ class Attachment(Model):
 
 class AccountingDocumentBase(UniqueMixin):
 
-    _display_fields = ["id", "number"]
+    _display_fields = ("id", "number")
 
     subject_id: int
 
@@ -348,10 +425,8 @@ class AccountingDocumentBase(UniqueMixin):
     total: Optional[Decimal] = None
     native_subtotal: Optional[Decimal] = None
 
-    lines: list[Line] = Field(default_factory=list[Line])
-    vat_rates_summary: list[VatRateSummary] = Field(
-        default_factory=list[VatRateSummary]
-    )
+    lines: list[Line] = Field(default_factory=list)
+    vat_rates_summary: list[VatRateSummary] = Field(default_factory=list)
 
     class Meta:
         always_include = ["subject_id"]
@@ -420,7 +495,7 @@ class EETRecord(UniqueMixin):
 class Invoice(AccountingDocumentBase):
     document_type: Optional[DocumentType] = None
     proforma_followup_document: Optional[ProformaFollowupDocument] = None
-    tax_document_ids: Optional[set[int]] = None
+    tax_document_ids: Optional[frozenset[int]] = None
     correction_id: Optional[int] = None
     # number inherited from AccountingDocumentBase
     number_format_id: Optional[int] = None
@@ -10,12 +10,19 @@ class FakeResponse(object):
     def __init__(self, text):
         self.text = text
 
+    @property
+    def content(self):
+        return self.text.encode("utf-8")
+
     def json(self):
         return json.loads(self.text)
 
     def raise_for_status(self):
         pass
 
+    def close(self):
+        pass
+
 
 def response(name: str):
     content = open(os.path.join(os.path.dirname(__file__), "responses", name)).read()
@@ -1,15 +1,24 @@
 import freezegun
+import json
+import time
 import unittest
 from unittest.mock import patch, MagicMock
 from decimal import Decimal
 
-from fakturoid.api import Fakturoid
-from fakturoid.models import InvoiceAction
+from fakturoid.api import Fakturoid, _format_string, extract_page_link
+from fakturoid.models import (
+    InvoiceAction,
+    Line,
+    LineInventory,
+    LockableAction,
+    VatRateSummary,
+)
 
 from tests.mock import response, FakeResponse
-from pytest import fixture
-from typing import cast
+from pytest import fixture, raises
+from typing import Any, cast
 from datetime import datetime
+from string import Template
 
 
 @fixture
@@ -29,7 +38,9 @@ def test_oauth_credentials_flow(frozen_time: freezegun.api.FrozenDateTimeFactory
         patch.object(
             fa.session, "get", return_value=response("invoice_9.json")
         ) as get_mock,
-        patch("requests.post", return_value=response("token.json")) as post_mock,
+        patch.object(
+            fa.session, "post", return_value=response("token.json")
+        ) as post_mock,
     ):
         get_mock = cast(MagicMock, get_mock)
         post_mock = cast(MagicMock, post_mock)
@@ -38,6 +49,15 @@ def test_oauth_credentials_flow(frozen_time: freezegun.api.FrozenDateTimeFactory
         assert fa._token.to_be_renewed == True
         fa._ensure_token()
         assert post_mock.call_count == 1
+        assert post_mock.call_args[0][0] == f"{fa.base_url}/oauth/token"
+        assert (
+            post_mock.call_args[1]["headers"]["Content-Type"]
+            == "application/x-www-form-urlencoded"
+        )
+        assert (
+            post_mock.call_args[1]["headers"]["Authorization"]
+            == "Basic Q0xJRU5UX0lEOkNMSUVOVF9TRUNSRVQ="
+        )
 
         fa.invoices.get(1)
         assert get_mock.call_count == 1
@@ -55,9 +75,32 @@ def test_oauth_credentials_flow(frozen_time: freezegun.api.FrozenDateTimeFactory
         assert get_mock.call_count == 3
 
 
+def test_extract_page_link():
+    url = "https://app.fakturoid.cz/api/v3/accounts/myslug/invoices.json"
+    assert extract_page_link("") is None
+    assert extract_page_link(f'<{url}?page=2>; rel="next"') is None
+    assert (
+        extract_page_link(
+            f'<{url}?page=2>; rel="next", <{url}?page=12&per_page=40>; rel="last"'
+        )
+        == 12
+    )
+    assert extract_page_link(f'<{url}?status=open&page=7>; rel="last"') == 7
+
+
+def test_format_string():
+    for text in ("accounts/${slug}/x", "accounts/$slug/x", "a/$$slug/{x}/${id}"):
+        template = Template(text)
+        context = {"slug": "myslug", "id": "1"}
+        assert _format_string(template).format_map(context) == template.substitute(
+            context
+        )
+    with raises(ValueError):
+        _format_string(Template("accounts/$/x"))
+
+
 class FakturoidTestCase(unittest.TestCase):
-    @patch("requests.post", return_value=response("token.json"))
-    def setUp(self, post_mock: MagicMock):
+    def setUp(self):
         self.fa = Fakturoid(
             "myslug",
             "CLIENT_ID",
@@ -65,10 +108,44 @@ class FakturoidTestCase(unittest.TestCase):
             "python-fakturoid-v3-tests (https://github.com/jarovo/python-fakturoid-v3)",
         )
 
-        self.fa._oauth_token_client_credentials_flow()
+        with patch.object(self.fa.session, "post", return_value=response("token.json")):
+            self.fa._oauth_token_client_credentials_flow()
         return super().setUp()
 
 
+class BindingTestCase(FakturoidTestCase):
+    def test_apis_bound_per_client(self):
+        other = Fakturoid("otherslug", "CLIENT_ID", "CLIENT_SECRET")
+        self.assertIs(self.fa, self.fa.subjects.fakturoid)
+        self.assertIs(other, other.subjects.fakturoid)
+        self.assertIs(self.fa.subjects, self.fa.subjects)
+        self.assertEqual("accounts/myslug/subjects", self.fa.subjects.base_path())
+        self.assertEqual("accounts/otherslug/subjects", other.subjects.base_path())
+
+    def test_type_adapters_built(self):
+        self.assertTrue(self.fa.invoices._item_type_adapter.pydantic_complete)
+        self.assertTrue(self.fa.invoices._page_type_adapter.pydantic_complete)
+        self.assertTrue(self.fa.current_user._item_type_adapter.pydantic_complete)
+
+
+class AuthorizationTestCase(FakturoidTestCase):
+    def test_header_set_once_per_token(self):
+        with patch.object(self.fa, "_set_authorization") as mock:
+            self.fa.ensure_authenticated()
+            self.fa.ensure_authenticated()
+        mock.assert_called_once_with(self.fa.user_agent, self.fa._token)
+
+    def test_fire_authenticates(self):
+        fa = Fakturoid("myslug", "CLIENT_ID", "CLIENT_SECRET")
+        with patch.object(
+            fa.session, "post", side_effect=[response("token.json"), FakeResponse("")]
+        ) as mock:
+            fa.invoice_action.fire(1, InvoiceAction.Lock)
+
+        self.assertEqual(f"{fa.base_url}/oauth/token", mock.call_args_list[0][0][0])
+        self.assertEqual(fa._token._auth_header, fa.session.headers["Authorization"])
+
+
 class AccountTestCase(FakturoidTestCase):
     def test_load(self):
         with patch.object(
@@ -140,8 +217,21 @@ class InvoiceTestCase(FakturoidTestCase):
 
         mock.assert_called_once_with(
             "https://app.fakturoid.cz/api/v3/accounts/myslug/invoices/9/fire.json",
-            data=None,
             params={"event": "cancel"},
+            stream=True,
+        )
+
+    def test_fire_expense(self):
+        with patch.object(
+            self.fa.session, "post", return_value=FakeResponse("")
+        ) as mock:
+            self.fa.expense_action.fire(3, LockableAction.Lock)
+            self.fa.expense_action.fire(4, LockableAction.Unlock)
+
+        mock.assert_called_with(
+            "https://app.fakturoid.cz/api/v3/accounts/myslug/expenses/4/fire.json",
+            params={"event": "unlock"},
+            stream=True,
         )
 
     def test_save_update_line(self):
@@ -167,8 +257,32 @@ class InvoiceTestCase(FakturoidTestCase):
             self.fa.invoices.save(invoice)
         put_mock.assert_called_once_with(
             "https://app.fakturoid.cz/api/v3/accounts/myslug/invoices/1.json",
-            data=new_response_text,
+            data=new_response_text.encode(),
+        )
+
+    def test_save_skips_default_fields(self):
+        with patch.object(
+            self.fa.session, "get", return_value=response("invoices.json")
+        ):
+            invoice = next(self.fa.invoices.index())
+
+        invoice.note = "Changed"
+        with patch.object(
+            self.fa.session, "patch", return_value=response("invoice_9.json")
+        ) as patch_mock:
+            self.fa.invoices.save(invoice)
+
+        sent = patch_mock.call_args[1]["data"]
+        self.assertEqual(
+            invoice.to_patch_payload().model_dump_json(exclude_unset=True).encode(),
+            sent,
         )
+        payload = json.loads(sent)
+        self.assertEqual("Changed", payload["note"])
+        # Nulls returned by the server, also on the lines, are not sent back.
+        self.assertNotIn(None, payload.values())
+        for line in payload["lines"]:
+            self.assertNotIn(None, line.values())
 
     def test_index(self):
         with patch.object(
@@ -185,6 +299,142 @@ class InvoiceTestCase(FakturoidTestCase):
         )
         # TODO paging test
 
+    def test_index_parallel_pages(self):
+        def get(url: str, params: dict[str, str]):
+            page = response("invoices.json")
+            page.headers = {
+                "Link": f'<{url}?page=3>; rel="last"',
+            }
+            return page
+
+        with patch.object(self.fa.session, "get", side_effect=get) as mock:
+            invoices = list(self.fa.invoices.index())
+
+        self.assertEqual(3, mock.call_count)
+        self.assertEqual(
+            ["1", "2", "3"],
+            sorted(call.kwargs["params"]["page"] for call in mock.call_args_list),
+        )
+        self.assertEqual(30, len(invoices))
+
+    def test_index_parallel_pages_renew_token_once(self):
+        def get(url: str, params: dict[str, str]):
+            if params["page"] == "1":
+                # The token comes due while the other pages are being fetched.
+                self.fa._token._renew_after_monotonic = 0.0
+            page = response("invoices.json")
+            page.headers = {"Link": f'<{url}?page=9>; rel="last"'}
+            return page
+
+        def post(*args: Any, **kwargs: Any):
+            time.sleep(0.05)  # Let the other workers find the token due too.
+            return response("token.json")
+
+        with (
+            patch.object(self.fa.session, "get", side_effect=get),
+            patch.object(self.fa.session, "post", side_effect=post) as post_mock,
+        ):
+            invoices = list(self.fa.invoices.index())
+
+        post_mock.assert_called_once()
+        self.assertEqual(90, len(invoices))
+
+    def test_index_parallel_pages_bounded(self):
+        def get(url: str, params: dict[str, str]):
+            page = response("invoices.json")
+            page.headers = {"Link": f'<{url}?page=50>; rel="last"'}
+            return page
+
+        self.fa.invoices.MAX_PAGE_WORKERS = 2
+        with patch.object(self.fa.session, "get", side_effect=get) as mock:
+            invoices = self.fa.invoices.index()
+            next(invoices)
+            invoices.close()
+
+        # The first page and at most MAX_PAGE_WORKERS pages ahead of it.
+        self.assertEqual(3, mock.call_count)
+
+    def test_index_stops_at_last_page(self):
+        page = response("invoices.json")
+        page.text = json.dumps(json.loads(page.text) * 4)  # A full page of 40.
+        page.headers = {"Link": '<invoices.json?page=1>; rel="last"'}
+        with patch.object(self.fa.session, "get", return_value=page) as mock:
+            invoices = list(self.fa.invoices.index())
+
+        mock.assert_called_once()
+        self.assertEqual(40, len(invoices))
+
+    def test_index_prefetch_pages(self):
+        full_page = response("invoices.json")
+        full_page.text = json.dumps(json.loads(full_page.text) * 4)
+        last_page = response("invoices.json")
+        with patch.object(
+            self.fa.session, "get", side_effect=[full_page, full_page, last_page]
+        ) as mock:
+            invoices = list(self.fa.invoices.index())
+
+        self.assertEqual(3, mock.call_count)
+        self.assertEqual("3", mock.call_args.kwargs["params"]["page"])
+        self.assertEqual(90, len(invoices))
+
+    def test_index_trust_server(self):
+        self.fa.trust_server = True
+        page = response("invoices.json")
+        data = json.loads(page.text)
+        data[0]["lines"][0]["inventory"] = {
+            "item_id": 1,
+            "sku": "SKU-1",
+            "article_number_type": None,
+            "move_id": 2,
+        }
+        page.text = json.dumps(data)
+        with patch.object(self.fa.session, "get", return_value=page):
+            invoices = list(self.fa.invoices.index())
+        self.assertEqual(10, len(invoices))
+        self.assertEqual("2025-0007", invoices[0].number)
+        self.assertIsInstance(invoices[0].lines[0], Line)
+        self.assertIsInstance(invoices[0].vat_rates_summary[0], VatRateSummary)
+        inventory = invoices[0].lines[0].inventory
+        self.assertIsInstance(inventory, LineInventory)
+        self.assertEqual("SKU-1", cast(LineInventory, inventory).sku)
+
+    def test_find_server_side(self):
+        with patch.object(
+            self.fa.session, "get", return_value=response("invoices.json")
+        ) as mock:
+            invoices = list(self.fa.invoices.find(number="2012-0004"))
+        mock.assert_called_once_with(
+            "https://app.fakturoid.cz/api/v3/accounts/myslug/invoices.json",
+            params={"number": "2012-0004", "page": "1"},
+        )
+        # Filtering is left to the server.
+        self.assertEqual(10, len(invoices))
+
+    def test_get_not_modified(self):
+        self.fa.etag_cache_size = 8
+        first = response("invoice_9.json")
+        first.headers = {"ETag": 'W/"abc"'}
+        not_modified = FakeResponse("")
+        not_modified.status_code = 304
+        with patch.object(
+            self.fa.session, "get", side_effect=[first, not_modified]
+        ) as mock:
+            self.fa.invoices.get(9)
+            invoice = self.fa.invoices.get(9)
+
+        self.assertEqual({"If-None-Match": 'W/"abc"'}, mock.call_args.kwargs["headers"])
+        self.assertEqual("2012-0004", invoice.number)
+
+    def test_get_etag_cache_off_by_default(self):
+        first = response("invoice_9.json")
+        first.headers = {"ETag": 'W/"abc"'}
+        with patch.object(self.fa.session, "get", return_value=first) as mock:
+            self.fa.invoices.get(9)
+            self.fa.invoices.get(9)
+
+        self.assertNotIn("headers", mock.call_args.kwargs)
+        self.assertEqual({}, self.fa._etag_cache)
+
 
 class InventoryTestCase(FakturoidTestCase):
     def test_find(self):
@@ -213,6 +463,35 @@ class InventoryTestCase(FakturoidTestCase):
         )
         self.assertEqual(203140, inventory_item.id)
 
+    def test_find_one(self):
+        full_page = response("inventory_items.json")
+        full_page.text = json.dumps(json.loads(full_page.text) * 10)
+        with patch.object(self.fa.session, "get", side_effect=[full_page] * 5) as mock:
+            inventory_item = self.fa.inventory_items.find_one(native_retail_price=400)
+
+        assert inventory_item
+        self.assertEqual(Decimal(400), inventory_item.native_retail_price)
+        # The second page may have been prefetched, the rest is never requested.
+        self.assertLessEqual(mock.call_count, 2)
+
+        with patch.object(
+            self.fa.session, "get", return_value=response("inventory_items.json")
+        ):
+            self.assertIsNone(self.fa.inventory_items.find_one(native_retail_price=-1))
+
+    def test_find_one_trust_server(self):
+        self.fa.trust_server = True
+        with patch.object(
+            self.fa.session, "get", return_value=response("inventory_items.json")
+        ):
+            inventory_item = self.fa.inventory_items.find_one(
+                native_retail_price=Decimal(400)
+            )
+
+        # Locally filtered pages are validated, so the decimals compare.
+        assert inventory_item
+        self.assertEqual(Decimal(400), inventory_item.native_retail_price)
+
 
 class GeneratorTestCase(FakturoidTestCase):
     def test_load(self):
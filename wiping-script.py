@@ -1,6 +1,10 @@
 import fakturoid
+from concurrent.futures import ThreadPoolExecutor
 from os import environ
-from fakturoid.models import InvoiceAction
+from fakturoid.models import Invoice, InvoiceAction
+
+# The session's connection pool is shared by the workers.
+MAX_WORKERS = 8
 
 
 def confirm_wipening_allowed():
@@ -15,20 +19,24 @@ confirm_wipening_allowed()
 fa = fakturoid.Fakturoid.from_env()
 
 
+def delete_invoice(invoice: Invoice):
+    if invoice.locked_at:
+        fa.invoice_action.fire(invoice.id, InvoiceAction.Unlock)
+    fa.invoices.delete(invoice.id)
+
+
 def delete_invoices():
     invoices_to_delete = list(fa.invoices.list())
     print(f"Deleting {invoices_to_delete}")
-    for invoice in invoices_to_delete:
-        if invoice.locked_at:
-            fa.invoice_action.fire(invoice.id, InvoiceAction.Unlock)
-        fa.invoices.delete(invoice.id)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        list(executor.map(delete_invoice, invoices_to_delete))
 
 
 def delete_subjects():
     subjects_to_delete = list(fa.subjects.list())
     print(f"Deleting {subjects_to_delete}")
-    for subject in subjects_to_delete:
-        fa.subjects.delete(subject.id)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        list(executor.map(fa.subjects.delete, (s.id for s in subjects_to_delete)))
 
 
 delete_invoices()